@@ -1,13 +1,19 @@
 import os
 import json
+import pytest
 from fastapi.testclient import TestClient
 from backend.main import app
 
 
-client = TestClient(app)
+@pytest.fixture(scope="session")
+def client():
+    # One client for the whole session: the lifespan (and app warm-up) runs
+    # once instead of being re-entered per test
+    with TestClient(app) as c:
+        yield c
 
 
-def test_health_and_schema():
+def test_health_and_schema(client):
     r = client.get("/health")
     assert r.status_code == 200
     data = r.json()
@@ -20,7 +26,7 @@ def test_health_and_schema():
     assert isinstance(schema.get("total_tables"), int)
 
 
-def test_sql_query_flow():
+def test_sql_query_flow(client):
     r = client.post("/api/query", json={"query": "how many employees", "use_cache": False})
     assert r.status_code == 200
     data = r.json()
@@ -29,7 +35,29 @@ def test_sql_query_flow():
     assert "generated_sql" in data
 
 
-def test_document_query_flow_without_db():
+def test_semantic_cache_respects_routing():
+    # "average salary" and "average salary by department" are near-identical
+    # text but route to different SQL templates; the semantic layer must not
+    # serve the overall average for the per-department query
+    from main import app as root_app
+
+    with TestClient(root_app) as c:
+        a = c.post("/api/query", json={"query": "average salary", "use_cache": True}).json()
+        b = c.post("/api/query", json={"query": "average salary by department", "use_cache": True}).json()
+        assert b["generated_sql"] != a["generated_sql"]
+        assert "GROUP BY" in b["generated_sql"].upper()
+
+
+def test_semantic_cache_respects_routing_backend(client):
+    # Same pair as the root-app test: near-identical text, different SQL
+    # templates, and the semantic layer must keep them apart
+    a = client.post("/api/query", json={"query": "average salary", "use_cache": True}).json()
+    b = client.post("/api/query", json={"query": "average salary by department", "use_cache": True}).json()
+    assert b["generated_sql"] != a["generated_sql"]
+    assert "GROUP BY" in b["generated_sql"].upper()
+
+
+def test_document_query_flow_without_db(client):
     # Ensure no documents DB then document query should return empty but succeed
     if os.path.exists(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "documents.db"))):
         os.remove(os.path.abspath(os.path.join(os.path.dirname(__file__), "..", "documents.db")))
@@ -41,4 +69,3 @@ def test_document_query_flow_without_db():
     # If doc DB missing, document path returns empty results gracefully
     if data["query_type"] == "document":
         assert data["results"].get("count", 0) >= 0
-